@@ -18,7 +18,6 @@ Utility functions dealing with blocks within a single span
 
 import hashlib
 import typing
-import struct
 from . import stripe
 
 # Currently, this isn't used
@@ -32,10 +31,10 @@ def dir_probe(key: str,\
 	cacheID.update(key.encode())
 	cacheID = cacheID.digest()
 
-	segIndex = struct.unpack("!Q", cacheID[:8])[0] % (searchStripe.numSegs())
+	segIndex = int.from_bytes(cacheID[:8], "big") % (searchStripe.numSegs())
 
 	# 4 Dirs in a bucket
-	bucketIndex = struct.unpack("!Q", cacheID[8:])[0] %\
+	bucketIndex = int.from_bytes(cacheID[8:], "big") %\
 	                            (searchStripe.numBuckets() // searchStripe.numSegs())
 
 	return segIndex, bucketIndex
@@ -33,6 +33,7 @@ Constants:
 
 import typing
 import os
+import concurrent.futures
 from . import span, utils
 
 # I just do these for static type analysis
@@ -272,7 +273,7 @@ def parseStorageConfig(contents: str) -> typing.Dict[str, Cache]:
 	"""
 	global PATH
 
-	contents, ret = contents.strip().split('\n'), {}
+	contents, caches = contents.strip().split('\n'), []
 
 	for i,line in enumerate(contents):
 		cache = line.strip()
@@ -285,6 +286,8 @@ def parseStorageConfig(contents: str) -> typing.Dict[str, Cache]:
 		cache = cache.split(' ')[0]
 
 		utils.log("config.parseStorageConfig: storage.config line:", cache)
+		# TODO: this doesn't work on Windows, should be checking for an alphabetic character
+		# TODO: followed by `:\` on that system (ideally w/o regex)
 		if not cache.startswith(os.sep):
 			utils.log("config.parseStorageConfig:", cache,
 			          "is a relative path - attempting to find in TS install directory")
@@ -311,11 +314,19 @@ def parseStorageConfig(contents: str) -> typing.Dict[str, Cache]:
 				raise OSError("line %d '%s' in storage.config specifies a directory "\
 				              "which does not appear to contain a cache file!"%(line,i))
 
-		# TODO: this doesn't work on Windows, should be checking for an alphabetic character
-		# TODO: followed by `:\` on that system (ideally w/o regex)
-		ret[cache] = (utils.fileSize(cache), span.Span(cache))
+		if cache in caches:
+			utils.log("config.parseStorageConfig:", cache, "is listed more than once - skipping")
+			continue
+		caches.append(cache)
 
-	return ret
+	if not caches:
+		return {}
+
+	# Each span is usually a separate disk, so their stripes' metadata are read in all at once.
+	with concurrent.futures.ThreadPoolExecutor(max_workers=len(caches)) as pool:
+		loaded = list(pool.map(span.Span, caches))
+
+	return {cache: (utils.fileSize(cache), s) for cache, s in zip(caches, loaded)}
 
 def readStorageConfig() -> int:
 	"""
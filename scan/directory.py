@@ -42,7 +42,57 @@ def dirSize(d: typing.List[int]) -> int:
 	represented by the list of uint16_ts `d` points.
 	"""
 	big, size = (d[1] & 0xC000) >> 14, (d[1] & 0x3F00) >> 10
-	return (size + 1) * (1 << (9 + 3*big))
+	return (size + 1) << (9 + 3*big)
+
+def dirSizes(dirs: np.ndarray) -> np.ndarray:
+	"""
+	Returns the approximate sizes of the objects to which each of the rows of uint16_ts in `dirs`
+	point (i.e. `dirSize` for an entire array of DirEntrys at once).
+	"""
+	# Only the one column is needed, so there's no sense widening the other four
+	w = dirs[:,1].astype(np.int64)
+	big, size = (w & 0xC000) >> 14, (w & 0x3F00) >> 10
+	return (size + 1) << (9 + 3*big)
+
+def dirOffsets(dirs: np.ndarray) -> np.ndarray:
+	"""
+	Returns the actual file-relative offsets of the content pointed at by each of the rows of
+	uint16_ts in `dirs` (i.e. `dirOffset` for an entire array of DirEntrys at once).
+	"""
+	offset = dirs[:,0].astype(np.int64)
+	offset += (dirs[:,1] & 0xFF).astype(np.int64) << 16
+	offset += dirs[:,4].astype(np.int64) << 24
+	offset -= 1
+	offset *= 0x200
+	return offset
+
+def parseDirEntries(dirs: typing.Union[np.ndarray, bytes]) -> typing.Dict[str, np.ndarray]:
+	"""
+	Unpacks the fields of each of the rows of uint16_ts in `dirs` (i.e. what `DirEntry` does for a
+	single entry, but for an entire array of them at once). `dirs` may also be the raw bytes of a
+	directory (or any part of one).
+
+	Returns a dictionary of the same names as the attributes of a `DirEntry` to arrays of the
+	values of those attributes for each entry. Keeping each field in its own array is both smaller
+	and faster than a record per entry, since most uses only look at a field or two.
+	"""
+	if not isinstance(dirs, np.ndarray):
+		dirs = np.frombuffer(dirs, dtype=np.uint16).reshape(-1, 5)
+
+	ret = {}
+	flags = dirs[:,2]
+
+	ret["length"] = dirSizes(dirs)
+	ret["_offset"] = dirs[:,0] + ((dirs[:,1] & 0xFF).astype(np.int64) << 16)\
+	                           + (dirs[:,4].astype(np.int64) << 24)
+	ret["token"] = (flags & 0x8000) != 0
+	ret["pinned"] = (flags & 0x4000) != 0
+	ret["head"] = (flags & 0x2000) != 0
+	ret["phase"] = (flags & 0x1000) != 0
+	ret["tag"] = flags & 0x0FFF
+	ret["next"] = dirs[:,3]
+	ret["Offset"] = (ret["_offset"] - 1) * 512
+	return ret
 
 class DirEntry():
 	"""
@@ -105,8 +155,9 @@ class DirEntry():
 	# n - bits pointing to next `Dir` in bucket (16)
 	# h - high offset bits (16)
 	BASIC_FORMAT = "HHHHH"
+	BASIC_STRUCT = struct.Struct(BASIC_FORMAT)
 
-	sizeof = struct.calcsize(BASIC_FORMAT)
+	sizeof = BASIC_STRUCT.size
 
 	# For some inscrutable reason, the size of a "cache block" is double-defined in the ats source
 	# code, firstly through this "CACHE_BLOCK_SHIFT" term and then immediately afterward the macro
@@ -125,20 +176,54 @@ class DirEntry():
 
 		Raises a ValueError if the magic number is wrong.
 		"""
-		if len(raw) != struct.calcsize(type(self).BASIC_FORMAT):
+		if len(raw) != self.sizeof:
 			raise ValueError("Not enough bytes to be a directory entry!")
 
 
-		# 'w' here is used for historical reasons;
-		# in the ATS source code, `w` is the name of the uint16_t array that holds a `Dir` struct's
-		# data.
-		w = struct.unpack(type(self).BASIC_FORMAT, raw)
+		self._parse(self.BASIC_STRUCT.unpack(raw))
+
+	@classmethod
+	def fromRow(cls, row: typing.Union[np.ndarray, typing.Sequence[int]]) -> 'DirEntry':
+		"""
+		Constructs a DirEntry directly from a row of five `uint16_t`s, e.g. one row of a stripe's
+		directory.
+
+		This avoids copying the row into a `bytearray` only to unpack it again. In fact, the row
+		isn't unpacked at all until one of the entry's fields is first accessed, so constructing
+		`DirEntry`s that are never inspected (e.g. most of a segment) costs next to nothing.
+		"""
+		ret = cls.__new__(cls)
+		ret.__dict__["_w"] = row
+		return ret
 
+	def __getattr__(self, name: str):
+		"""
+		Unpacks the fields of a `DirEntry` constructed with `fromRow` the first time any of them is
+		accessed.
+
+		(This is only ever called for attributes that aren't already set)
+		"""
+		w = self.__dict__.pop("_w", None)
+		if w is None:
+			raise AttributeError("'%s' object has no attribute '%s'" % (type(self).__name__, name))
+
+		# Python ints are needed here, because the offset bits get shifted well past 16 bits
+		self._parse(w.tolist() if isinstance(w, np.ndarray) else w)
+		return getattr(self, name)
+
+	def _parse(self, w: typing.Sequence[int]):
+		"""
+		Sets the fields of this directory entry from its five half-words, `w`.
+
+		'w' here is used for historical reasons;
+		in the ATS source code, `w` is the name of the uint16_t array that holds a `Dir` struct's
+		data.
+		"""
 		big, size = (w[1] & 0xC000) >> 14, (w[1] & 0x3F00) >> 10
 		off = w[0] + ((w[1] & 0x00FF) << 16) + (w[4] << 24)
 
 		# This makes object initialization much faster.
-		self.__dict__ = {"length"  : (size + 1) * (1 << (9 + (3*big))),
+		self.__dict__ = {"length"  : (size + 1) << (9 + 3*big),
 		                 "_offset" : off,
 		                 "token"   : w[2] & 0x8000 == 0x8000,
 		                 "pinned"  : w[2] & 0x4000 == 0x4000,
@@ -364,6 +449,34 @@ class Doc(ctypes.Structure):
 	# 	#endif
 	# 	return "IIQ%dsI4BIIII" % (2*config.INK_MD5_SIZE())
 
+	@classmethod
+	def fromBuffer(cls, buffer: bytes, length: int, dirent: DirEntry = None) -> typing.Optional['Doc']:
+		"""
+		Constructs a `Doc`, along with its metadata and data, from the first `length` bytes of
+		`buffer`.
+
+		Returns `None` if those bytes don't hold a `Doc` with metadata. `dirent` is only used to
+		show where the `Doc` was found in debugging output.
+		"""
+		if length < cls.sizeof:
+			return None
+
+		doc = cls.from_buffer_copy(buffer)
+
+		if doc.magic == cls.MAGIC and doc.hlen > 0:
+			try:
+				doc.setInfo(buffer[cls.sizeof : min(doc.hlen, length)])
+				doc.setData(buffer[cls.sizeof + doc.hlen : min(doc.length, length)])
+			except struct.error as e:
+				utils.log("Doc.fromBuffer: Error reading doc pointed to by", dirent, ':', e)
+				utils.log_exc("Doc.fromBuffer:")
+			else:
+				return doc
+		elif doc.magic == cls.CORRUPT_MAGIC:
+			utils.log("Doc.fromBuffer: Corrupt Doc pointed to by", dirent, ':', doc)
+
+		return None
+
 	def version(self):
 		"""
 		Returns the version of this object as a string in the format
@@ -103,6 +103,18 @@ class HDRHeap():
 	# The "Magic number" of a HdrHeap object.
 	MAGIC = 0xDCBAFEED
 
+	# There are two of these for every alternate of every object
+	__slots__ = ("magic",
+	             "freeStart",
+	             "dataStart",
+	             "size",
+	             "writeable",
+	             "next",
+	             "freeSize",
+	             "rwheap",
+	             "ronlyHeaps",
+	             "lostStrSpace")
+
 	def __init__(self, raw: bytes):
 		"""
 		Constructs a HdrHeap from its raw data
@@ -263,10 +275,15 @@ class HTTPHdr():
 
 
 
+# The bytes of a HdrHeapObjImpl: its type, the low 16 bits of its length, and then the high 4 bits
+# of its length along with its flags
+HDR_HEAP_OBJ_STRUCT = struct.Struct("=BHB")
 
-def unpackHdrHeapObjImpl(obj: bytes) -> HdrHeapObjImpl:
+def unpackHdrHeapObjImpl(obj: bytes,
+                         offset: int = 0,
+                         _unpack=HDR_HEAP_OBJ_STRUCT.unpack_from) -> HdrHeapObjImpl:
 	"""
-	Unpacks a HdrHeapObjImpl from the passed bytes.
+	Unpacks a HdrHeapObjImpl from the passed bytes, starting at `offset`.
 
 	Note that this is not trivial, as the structure is implemented with non-byte-aligned bitfields
 	in the ATS source.
@@ -279,11 +296,23 @@ def unpackHdrHeapObjImpl(obj: bytes) -> HdrHeapObjImpl:
 	# the same unit." In the event that enough space does *not* remain, _then_ it's implementation-
 	# defined. Plus, technically an implementation is not forced to use the largest data structure
 	# that it can, but most do. Let's hope that's enough.
-	t, l, f = struct.unpack("=B2sB", obj)
-	flags = (0xF0 & f) >> 4
-	l = struct.unpack("=H", l)[0] + ((f & 0xF) << 16)
+	t, l, f = _unpack(obj, offset)
+
+	return HdrHeapObjImpl(t, l | ((f & 0xF) << 16), f >> 4)
 
-	return HdrHeapObjImpl(t,l,flags)
+# The native unsigned int at the start of an HTTPImpl that says whether it's a request or a response
+POLARITY_STRUCT = struct.Struct("I")
+
+# The layouts of the objects found in header heaps. Each object's pointer-sized members are aligned
+# independently of the rest of it, so those are unpacked from trailing bytes in a second step.
+REQUEST_IMPL_STRUCT = struct.Struct("Ii4x%ds" % struct.calcsize("PPHhP"))
+REQUEST_FIELDS_STRUCT = struct.Struct("PPHhP")
+RESPONSE_IMPL_STRUCT = struct.Struct("Ii4x%ds" % struct.calcsize("PHhP"))
+RESPONSE_FIELDS_STRUCT = struct.Struct("PHhP")
+URL_IMPL_STRUCT = struct.Struct("10h%ds" % struct.calcsize("10PhHBB?"))
+URL_FIELDS_STRUCT = struct.Struct("10PhHBB?")
+MIME_FIELD_BLOCK_IMPL_STRUCT = struct.Struct("IP" + "3PhH4s"*16)
+MIME_FIELD_IMPL_STRUCT = struct.Struct("4xL4II4i?PIP" + "3PhH4s"*16)
 
 def unpackHTTPImplHeap(heap: bytes, start: int, http: HTTPHdr) -> typing.List[int]:
 	"""
@@ -295,14 +324,13 @@ def unpackHTTPImplHeap(heap: bytes, start: int, http: HTTPHdr) -> typing.List[in
 
 	Returns the decoded reason/method followed by the actual fields of the HTTPImpl.
 	"""
-	polarity = struct.unpack("I", heap[start:start+struct.calcsize("I")])[0]
+	# (Raises a struct.error, rather than reading garbage, if the heap is cut off here)
+	polarity = POLARITY_STRUCT.unpack_from(heap, start)[0]
 
 	if polarity == 1:
 		# Request header
-		fmt = "Ii4x%ds" % struct.calcsize("PPHhP")
-		obj = list(struct.unpack(fmt, heap[start:start+struct.calcsize(fmt)]))
-		for part in struct.unpack("PPHhP", obj.pop()):
-			obj.append(part)
+		obj = list(REQUEST_IMPL_STRUCT.unpack_from(heap, start))
+		obj.extend(REQUEST_FIELDS_STRUCT.unpack(obj.pop()))
 
 		#gets the actual method name
 		http.method = heap[obj[3]:obj[3]+obj[4]].decode()
@@ -311,10 +339,8 @@ def unpackHTTPImplHeap(heap: bytes, start: int, http: HTTPHdr) -> typing.List[in
 
 	if polarity == 2:
 		# Response header
-		fmt = "Ii4x%ds" % struct.calcsize("PHhP")
-		obj = list(struct.unpack(fmt, heap[start:start+struct.calcsize(fmt)]))
-		for part in struct.unpack("PHhP", obj.pop()):
-			obj.append(part)
+		obj = list(RESPONSE_IMPL_STRUCT.unpack_from(heap, start))
+		obj.extend(RESPONSE_FIELDS_STRUCT.unpack(obj.pop()))
 
 		# Gets the "reason" (?) name
 		http.reason = heap[obj[2]:obj[2]+obj[3]].decode()
@@ -332,10 +358,8 @@ def unpackURLImplHeap(heap: bytes, start: int, http: HTTPHdr) -> typing.List[int
 
 	Returns the constructed URL, followed by the actual data member fields of the unpacked URLImpl.
 	"""
-	fmt = "10h%ds" % struct.calcsize("10PhHBB?")
-	obj = list(struct.unpack(fmt, heap[start:start+struct.calcsize(fmt)]))
-	for part in struct.unpack("10PhHBB?", obj.pop()):
-		obj.append(part)
+	obj = list(URL_IMPL_STRUCT.unpack_from(heap, start))
+	obj.extend(URL_FIELDS_STRUCT.unpack(obj.pop()))
 
 	lens = obj[:8]
 	ptrs = obj[10:18]
@@ -359,9 +383,7 @@ def unpackMIMEFieldBlockImplHeap(heap: bytes, start: int, unused_http: object) -
 
 	Returns a list of the data member fields for the stored object.
 	"""
-	fmt = "IP"
-	fmt += "3PhH4s"*16
-	return list(struct.unpack(fmt, heap[start:start+struct.calcsize(fmt)]))
+	return list(MIME_FIELD_BLOCK_IMPL_STRUCT.unpack_from(heap, start))
 
 def unpackMIMEFieldImplHeap(heap: bytes, start: int, unused_http: object) -> typing.List[int]:
 	"""
@@ -369,9 +391,7 @@ def unpackMIMEFieldImplHeap(heap: bytes, start: int, unused_http: object) -> typ
 
 	Returns a list of the values of the data members of the stored object.
 	"""
-	fmt = "4xL4II4i?PIP"
-	fmt += "3PhH4s"*16
-	return list(struct.unpack(fmt, heap[start:start+struct.calcsize(fmt)]))
+	return list(MIME_FIELD_IMPL_STRUCT.unpack_from(heap, start))
 
 # This maps the types of HdrHeapObjImpl's to functions that unpack them.
 UNPACK_FUNCS = {2: unpackURLImplHeap,
@@ -429,7 +449,9 @@ class Alternate():
 	             "responseHeaders",)
 
 
-	sizeof = utils.align(struct.calcsize(BASIC_FORMAT), struct.calcsize("L"))
+	BASIC_STRUCT = struct.Struct(BASIC_FORMAT)
+
+	sizeof = utils.align(BASIC_STRUCT.size, struct.calcsize("L"))
 
 	def __init__(self, basicData: typing.Tuple[int, ...]):
 		"""
@@ -560,7 +582,7 @@ class Alternate():
 			return current
 
 		# Read in the constant-length stuff
-		basicData = struct.unpack(cls.BASIC_FORMAT, raw[:cls.sizeof])
+		basicData = cls.BASIC_STRUCT.unpack_from(raw)
 
 		# Create a new object to hold the latest Alternate being read in from 'raw'
 		try:
@@ -655,20 +677,24 @@ def unpackHeap(heap: bytes, offset: int, size: int, http: HTTPHdr) -> \
 
 	ret = []
 
+	# Objects are pointer-aligned, and pointer sizes are powers of two, so this is `utils.align`
+	# without a function call per object
+	alignMask = utils.POINTER_SIZE - 1
+
 	while offset < size:
 		try:
-			newHdrObj = unpackHdrHeapObjImpl(heap[offset : offset+4])
+			newHdrObj = unpackHdrHeapObjImpl(heap, offset)
 
-			if newHdrObj.Type in UNPACK_FUNCS:
-				ret.append((newHdrObj, UNPACK_FUNCS[newHdrObj.Type](heap, offset+4, http)))
+			unpack = UNPACK_FUNCS.get(newHdrObj.Type)
+			if unpack is not None:
+				ret.append((newHdrObj, unpack(heap, offset+4, http)))
 
 			else:
 				fmt = "%ds" % (newHdrObj.length-4)
-				ret.append((newHdrObj,
-				            struct.unpack(fmt, heap[offset+4:offset+4+struct.calcsize(fmt)])))
+				ret.append((newHdrObj, struct.unpack_from(fmt, heap, offset+4)))
 
 
-			offset = utils.align(offset + newHdrObj.length, utils.POINTER_SIZE)
+			offset = (offset + newHdrObj.length + alignMask) & ~alignMask
 		except (struct.error, UnicodeError):
 			utils.log("http.unpackHeap: An error occurred processing -")
 			utils.log_exc("http.unpackHeap:")
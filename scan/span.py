@@ -17,11 +17,17 @@ Holds utilities for dealing with a single span
 """
 
 import struct
-import sys
 import typing
-import asyncio
 from . import stripe, utils
 
+class BadStripeError(ValueError):
+	"""
+	Raised when a span block header declares a stripe that cannot be constructed.
+
+	A `Span` does not raise these itself; instead it collects them in its `badStripes` list so that
+	callers may decide how to recover from (or report) all of them at once.
+	"""
+
 class Span():
 	"""
 	Represents a cache span
@@ -35,6 +41,9 @@ class Span():
 		utils.log("Span: initializing from", file)
 		self.file = file
 		self.blocks = []
+
+		# Holds a `BadStripeError` for every stripe that couldn't be constructed
+		self.badStripes = []
 		with open(file, 'rb') as spanFile:
 
 			spanFile.seek(DiskHeader.OFFSET)
@@ -45,31 +54,30 @@ class Span():
 				utils.log_exc("Span.__init__:")
 				raise ValueError("%s does not appear to be a valid ATS cache! (%s)" % (file, e))
 
-			sbhHeaderFormat = stripe.SpanBlockHeader.BASIC_FORMAT*self.header.diskvolBlocks
-			buffer = bytearray(struct.calcsize(sbhHeaderFormat))
+			sbhStruct = stripe.SpanBlockHeader.BASIC_STRUCT
+			buffer = bytearray(sbhStruct.size * self.header.diskvolBlocks)
 
 			try:
 				spanFile.readinto(buffer)
 			except (OSError, IOError) as e:
 				utils.log_exc("Span.__init__:")
-				print("Error reading span file '%s': '%s'", file, e)
-
-			try:
-				spanBlockHeaders = struct.unpack(sbhHeaderFormat, buffer)
-			except struct.error as e:
-				utils.log_exc("Span.__init__:")
-				raise ValueError("Malformed DiskHeader object in cache file '%s'" % (file,))
+				raise OSError("Error reading span file '%s': '%s'" % (file, e)) from e
 
-			for i in range(0, len(spanBlockHeaders), 4):
+			# Each header is unpacked directly into a stripe as we go, rather than unpacking all of
+			# them into one huge tuple and slicing it back up four fields at a time.
+			for i, spanBlockHeader in enumerate(sbhStruct.iter_unpack(buffer)):
 				try:
-					spanblock = stripe.Stripe(spanBlockHeaders[i:i+4], file)
-				except ValueError:
-					utils.log_exc("Span.__init__: stripe construction:")
-					print("stripe header seems to declare an invalid stripe!", file=sys.stderr)
+					spanblock = stripe.Stripe(spanBlockHeader, file)
+				except ValueError as e:
+					err = "Stripe #%d of '%s' is invalid: %s" % (i, file, e)
+					self.badStripes.append(BadStripeError(err))
 				else:
 					spanblock.read()
 					self.blocks.append(spanblock)
 
+		if self.badStripes:
+			utils.log("Span.__init__:", len(self.badStripes), "bad stripe headers skipped in", file)
+
 	def __str__(self) -> str:
 		"""
 		Returns a string representation of a span
@@ -109,7 +117,6 @@ class Span():
 		"""
 		return len(self) > 0
 
-	@asyncio.coroutine
 	def storedObjects(self) -> typing.Generator[typing.Tuple[str, int], None, None]:
 		"""
 		Gets a list of all the urls stored in all of the stripes in this span.
@@ -127,8 +134,8 @@ class Span():
 
 			# Directories can use up huge amounts of space
 			if cleanUp:
-				cleanUp, block.directory = False, None
-
+				cleanUp = False
+				block.releaseDir()
 
 	# def tryReadObject(self, key: str) -> str:
 	# 	"""
@@ -146,6 +153,9 @@ class DiskHeader():
 	# 5 unsigned ints followed by an unsigned long long, all in native sizes.
 	BASIC_FORMAT = "5IQ"
 
+	# Compiled once so that the format string needn't be parsed for every header
+	BASIC_STRUCT = struct.Struct(BASIC_FORMAT)
+
 	# The magic number that identifies a cache
 	MAGIC = 0xABCD1237
 
@@ -153,7 +163,10 @@ class DiskHeader():
 	# (Presumably done to avoid colliding with a user's partition table?)
 	OFFSET = 0x2000
 
-	sizeof = struct.calcsize(BASIC_FORMAT)
+	sizeof = BASIC_STRUCT.size
+
+	# There's one of these per span, and the magic number is only needed for validation
+	__slots__ = ("volumes", "free", "used", "diskvolBlocks", "blocks")
 
 	def __init__(self, raw_data: bytes):
 		"""
@@ -167,7 +180,7 @@ class DiskHeader():
 			self.free,\
 			self.used,\
 			self.diskvolBlocks,\
-			self.blocks = struct.unpack(self.BASIC_FORMAT, raw_data)
+			self.blocks = self.BASIC_STRUCT.unpack(raw_data)
 		except struct.error:
 			utils.log("DiskHeader.__init__: raw_data:", raw_data)
 			utils.log_exc("DiskHeader.__init__:")
@@ -19,15 +19,41 @@ Contains data structures that represent stipe objects and sub-objects.
 import struct
 import typing
 import time
-import asyncio
+import concurrent.futures
+import functools
 import io
-import multiprocessing
+import os
+import operator
+import sys
 import numpy as np
 from . import directory, utils
 #uncommentif PYTHON_MAJOR_VERSION > 5
 #from . import config
 #endif
 
+# The size of the read buffer used when reading in many Docs from a stripe. Docs are read in
+# on-disk order, so a large buffer can serve several consecutive small Docs with a single read.
+READ_BUFFER_SIZE = 0x100000
+
+# The initial size of the buffer that Docs are read into when reading many of them. It grows as
+# needed to fit larger Docs.
+DOC_BUFFER_SIZE = 0x10000
+
+# The index, within a directory row viewed as ten bytes, of the byte that holds a `DirEntry`'s
+# 'phase' and 'head' bits (the high byte of its third word).
+FLAGS_BYTE = 5 if sys.byteorder == "little" else 4
+
+def _avgObjSize() -> int:
+	"""
+	Gets the average object size according to the ATS configuration (defaults to 8000).
+	"""
+	from . import config # Ugly, but avoids a python 3.4-specific circular import problem
+	return config.settings().get('cache.min_average_object_size', 8000)
+
+# The fields of a `DirEntry` by which `Stripe.index` finds it in a directory, and a function that
+# gets them from a `DirEntry` (in the same order)
+INDEX_FIELDS = ("_offset", "length", "next", "tag", "token", "pinned", "head", "phase")
+_indexKey = operator.attrgetter(*INDEX_FIELDS)
 
 class SpanBlockHeader():
 	"""
@@ -53,8 +79,12 @@ class SpanBlockHeader():
 	# those last two 'I's are bitfields (3b and 1b, respectively),
 	# so they get packed in a special way.
 
+	# Compiled once so that the format string needn't be parsed for every header
+	BASIC_STRUCT = struct.Struct(BASIC_FORMAT)
 
-	sizeof = struct.calcsize(BASIC_FORMAT)
+	sizeof = BASIC_STRUCT.size
+
+	__slots__ = ("offset", "length", "number", "Type", "free", "avgObjSize")
 
 	########################################################
 	###                                                  ###
@@ -75,7 +105,7 @@ class SpanBlockHeader():
 			self.offset,\
 			self.length,\
 			self.number,\
-			typeFree = struct.unpack(self.BASIC_FORMAT, raw_data)
+			typeFree = self.BASIC_STRUCT.unpack(raw_data)
 
 
 		# This assumes that raw_data is a tuple of 4 integers.
@@ -93,11 +123,7 @@ class SpanBlockHeader():
 		# 	raise ValueError
 
 		# Sets the average object size according to the ATS configuration (defaults to 8000)
-		from . import config # Ugly, but avoids a python 3.4-specific circular import problem
-		self.avgObjSize = 8000
-		configuration = config.settings()
-		if 'cache.min_average_object_size' in configuration:
-			self.avgObjSize = configuration['cache.min_average_object_size']
+		self.avgObjSize = _avgObjSize()
 
 	def __bool__(self) -> bool:
 		"""
@@ -149,7 +175,9 @@ class Stripe():
 
 	BASIC_FORMAT = "Ihhl3Q8I"
 
-	sizeof = struct.calcsize(BASIC_FORMAT)
+	BASIC_STRUCT = struct.Struct(BASIC_FORMAT)
+
+	sizeof = BASIC_STRUCT.size
 
 	########################################################
 	###                                                  ###
@@ -158,7 +186,6 @@ class Stripe():
 	########################################################
 
 	@property
-	@asyncio.coroutine
 	def segments(self) -> typing.Generator[directory.Segment, None, None]:
 		"""
 		This generator renders stripes iterable over their segments.
@@ -170,7 +197,6 @@ class Stripe():
 			yield self.getSegment(seg)
 
 	@property
-	@asyncio.coroutine
 	def buckets(self) -> typing.Generator[directory.Bucket, None, None]:
 		"""
 		This generator method renders stripes iterable over their buckets.
@@ -184,7 +210,6 @@ class Stripe():
 				yield self.getBucket(i, j)
 
 	@property
-	@asyncio.coroutine
 	def heads(self) -> typing.Generator[directory.DirEntry, None, None]:
 		"""
 		An iterable of the 'head' DirEntrys in this stripe.
@@ -194,21 +219,12 @@ class Stripe():
 		Only yields `DirEntry`s determined to be "phase-valid" (see `scan.directory.DirEntry.valid`)
 		Raises an IndexError if the directory is corrupt
 		"""
-		# Selects for non-zero offsets
-		heads = self.directory[\
-		                          self.directory[:,0] + \
-		                          (self.directory[:,1] & 0xFF) + \
-		                          self.directory[:,4] \
-		                      > 0]
+		if self._headsMask is None:
+			self._headsMask = self.headsMask()
 
-		# Selects for in-phase heads
-		if self.phase:
-			yield from heads[heads[:,2] & 0x3000 == 0x3000]
-		else:
-			yield from heads[(heads[:,2] & 0x3000) ^ 0x2000 == 0]
+		yield from self.directory[self._headsMask]
 
 	@property
-	@asyncio.coroutine
 	def firstDocs(self) -> typing.Generator[directory.Doc, None, None]:
 		"""
 		This generator method renders stripes iterable over their 'first Docs'
@@ -220,40 +236,41 @@ class Stripe():
 
 		Yields successive 'first' Docs from the stripe, reading
 		in values as needed.
+		Docs are read (and yielded) in the order in which they appear on disk, *not* in the order
+		in which their `DirEntry`s appear in the directory, so that reads are as close to sequential
+		as possible and can mostly be served out of one large read buffer.
 		Raises an OSError if the stripe's file cannot be read from.
 		Captures Exceptions raised during Doc construction, and prints summaries
 		if running without optimization.
 		"""
+		if self._headsMask is None:
+			self._headsMask = self.headsMask()
+
+		heads = self.directory[self._headsMask]
+		offsets = directory.dirOffsets(heads) + self.contentOffset
+		order = offsets.argsort(kind="mergesort")
+		sizes = directory.dirSizes(heads)[order].tolist()
 
-		# Passes in here are necessary because `assert` statements may not exist when run with
-		# -OO, so without them it could throw a SyntaxError with the message "Expected indented
-		# block".
-		#pylint: disable=W0107
-		with io.open(self.file, 'rb') as f:
-			for d in self.heads:
-				buffer = bytearray(directory.dirSize(d))
+		# Bound once here, rather than looked up again for every Doc
+		fromBuffer = directory.Doc.fromBuffer
 
-				f.seek(self.contentOffset + directory.dirOffset(d))
+		# This buffer is reused between iterations, and only grows when a Doc doesn't fit in it, so
+		# nothing read into it may be kept without copying it out first.
+		buffer = bytearray(DOC_BUFFER_SIZE)
+		view = memoryview(buffer)
+		with io.open(self.file, 'rb', READ_BUFFER_SIZE) as f:
+			for d, offset, need in zip(heads[order], offsets[order].tolist(), sizes):
+				if need > len(buffer):
+					view.release()
+					buffer = bytearray(max(need, 2*len(buffer)))
+					view = memoryview(buffer)
+
+				f.seek(offset)
 
 				# read in the entire structure at once
-				f.readinto(buffer)
-
-				doc = directory.Doc.from_buffer(buffer[:directory.Doc.sizeof])
-
-				if doc.magic == directory.Doc.MAGIC and doc.hlen > 0:
-					try:
-						doc.setInfo(buffer[directory.Doc.sizeof : doc.hlen])
-						doc.setData(buffer[directory.Doc.sizeof + doc.hlen : len(doc)])
-					except struct.error as e:
-						utils.log("Stripe.firstDocs: Error reading doc pointed to by", d,":", e)
-						utils.log_exc("Stripe.firstDocs:")
-						pass
-					else:
-						yield doc
-				elif doc.magic == directory.Doc.CORRUPT_MAGIC:
-					assert not print("Corrupt Doc pointed to by %s: '%s'" % (d, doc))
-					pass
-		#pylint: enable=W0107
+				doc = fromBuffer(buffer, f.readinto(view[:need]), d)
+				if doc is not None:
+					yield doc
 
 	########################################################
 	###                                                  ###
@@ -298,6 +315,15 @@ class Stripe():
 		# This will hold a memory map of the stripe's directory
 		self.directory = None
 
+		# Caches the selection of in-phase heads from the directory (see `headsMask`)
+		self._headsMask = None
+
+		# Maps the fields of in-use directory entries to their rows (see `index`)
+		self._indexMap = None
+
+		# A file descriptor kept open by `fetch` (see `close`)
+		self._fd = None
+
 		# Caches the urls stored in a stripe.
 		self.objs = []
 
@@ -353,6 +379,15 @@ class Stripe():
 		"""
 		return len(self.spanBlockHeader)
 
+	def __del__(self):
+		"""
+		Implements `del self`
+
+		Closes any file descriptor left open by `self.fetch`.
+		"""
+		if getattr(self, "_fd", None) is not None:
+			self.close()
+
 	def __getitem__(self,
 	                indicies: typing.Union[int,
 	                                       typing.Tuple[int, int],
@@ -398,12 +433,16 @@ class Stripe():
 		MUST be called prior to fetching either `DirEntry`s or `Doc`s out of the stripe.
 		"""
 		utils.log("Stripe.read: reading in metadata for", self)
+		self._headsMask, self._indexMap = None, None
 
-		with io.open(self.file, 'rb') as infile:
+		fd = os.open(self.file, os.O_RDONLY)
+		try:
 
-			raw_header_A = bytearray(self.sizeof)
-			infile.seek(self.spanBlockHeader.offset)
-			infile.readinto(raw_header_A)
+			# Short reads (e.g. past the end of a file) are padded out with zeroes, which will then
+			# simply fail the magic number check. `os.pread` doesn't move a shared file position,
+			# so stripes can safely be read in several threads at once.
+			raw_header_A = os.pread(fd, self.sizeof, self.spanBlockHeader.offset)
+			raw_header_A = raw_header_A.ljust(self.sizeof, b'\0')
 
 			# Now I need to determine the size of the metadata. Currently, the only way
 			# to know this for sure is to  either seek across the disk, one store block at
@@ -412,7 +451,9 @@ class Stripe():
 			# This will likely change in cache version 25.0, but until then...
 			self.numBuckets,\
 			self.numSegs,\
-			self.contentOffset = SORdirSize(self.spanBlockHeader.offset, len(self))
+			self.contentOffset = SORdirSize(self.spanBlockHeader.offset,
+			                                len(self),
+			                                self.spanBlockHeader.avgObjSize)
 
 			self.directoryOffset= utils.align(self.spanBlockHeader.offset+self.sizeof+2*self.numSegs)
 
@@ -425,29 +466,26 @@ class Stripe():
 			offsetB = utils.align(self.directoryOffset + 10*self.numDirEntries) + self.sizeof
 			offsetB = utils.align(offsetB)
 			utils.log("Stripe.read: offset calculated for copy B metadata:", hex(offsetB))
-			infile.seek(offsetB)
-			raw_header_B = bytearray(self.sizeof)
-			infile.readinto(raw_header_B)
+			raw_header_B = os.pread(fd, self.sizeof, offsetB).ljust(self.sizeof, b'\0')
+		finally:
+			os.close(fd)
 
 
-		A = struct.unpack(self.BASIC_FORMAT, raw_header_A)
+		A = self.BASIC_STRUCT.unpack(raw_header_A)
 		utils.log("Stripe.read: raw header for copy A:", A)
-		B = struct.unpack(self.BASIC_FORMAT, raw_header_B)
+		B = self.BASIC_STRUCT.unpack(raw_header_B)
 		utils.log("Stripe.read: raw header for copy B:", B)
 
-		del raw_header_A, raw_header_B
-
 		# Whichever metadata copy has a greater sync_serial value is more up-to-date, so if that's
 		# copy B some things need to be updated. However, for large stripes there's an error in the
 		# calculations for the offset of B, so we first ensure that it contains a valid magic number.
-		if B[0] == self.MAGIC and B[10] > A[10]:
+		# (Comparing the sync_serials first skips the magic check for the usual case of a stale B)
+		if B[10] > A[10] and B[0] == self.MAGIC:
 			self.spanBlockHeader.offset = offsetB
 			self.directoryOffset = utils.align(offsetB + self.sizeof+2*self.numSegs)
 			data = B
-			del A
 		else:
 			data = A
-			del B
 
 		magic = data[0]
 		if magic != self.MAGIC:
@@ -480,18 +518,75 @@ class Stripe():
 		"""
 		Reads in the entire directory. Not for the faint of heart.
 
-		I *highly* recommend that if this is used, you later do `self.directory.clear()`
-		so that memory usage doesn't get out of control.
+		The directory is memory-mapped rather than read, so pages are only loaded as they're
+		accessed (and the OS is free to drop them again). When you're done with it, use
+		`self.releaseDir()` so the mapping doesn't outlive its usefulness.
 		Note that you *MUST* have called `self.read()` prior to the calling of this method.
+
+		Calling this again re-uses the existing mapping, unless `self.read()` has since moved the
+		directory. Anything computed from the directory's contents is still thrown out, since the
+		file may have been written to in the meantime.
 		"""
+		self._headsMask, self._indexMap = None, None
+
+		d = self.directory
+		if d is not None and d.offset == self.directoryOffset and len(d) == self.numDirEntries:
+			utils.log("Stripe.readDir: directory already mapped for", self)
+			return
+
 		utils.log("Stripe.readDir: reading in directory for", self)
-		with io.open(self.file, 'rb', self.numDirEntries * 10) as infile:
-			infile.seek(self.directoryOffset)
+		self.directory = np.memmap(self.file,
+		                           dtype=np.uint16,
+		                           mode='r',
+		                           offset=self.directoryOffset,
+		                           shape=(self.numDirEntries, 5))
+
+	def releaseDir(self):
+		"""
+		Releases the directory read in by `self.readDir`.
+		"""
+		utils.log("Stripe.releaseDir: releasing directory for", self)
+		self.directory, self._headsMask, self._indexMap = None, None, None
+
+	def close(self):
+		"""
+		Closes the file descriptor opened by `self.fetch`, if there is one.
+
+		It's safe to call this more than once, and `fetch` will simply re-open the file if called
+		afterward.
+		"""
+		if self._fd is not None:
+			os.close(self._fd)
+			self._fd = None
 
-			self.directory = np.fromfile(infile,
-			                             dtype=directory.npDirEntry,
-			                             count=self.numDirEntries).view(dtype='u2')\
-			                                                      .reshape(self.numDirEntries, 5)
+	def headsMask(self) -> np.ndarray:
+		"""
+		Selects the in-phase 'head' `DirEntry`s of the directory.
+
+		Returns a boolean array with one element per row of `self.directory`, which is `True`
+		wherever that row has a non-zero offset, has its 'head' bit set, and has a phase bit that
+		matches the stripe's phase.
+		"""
+		d = self.directory
+
+		# OR-ing the offset bits together (rather than summing them) can't overflow a `uint16_t`
+		nonZero = (d[:,0] | (d[:,1] & 0xFF) | d[:,4]) != 0
+
+		# The 'phase' and 'head' bits (0x3000) both lie in one byte, so they can be checked on
+		# single bytes rather than whole words, which halves the size of the temporaries.
+		flags = d.view(np.uint8)[:,FLAGS_BYTE]
+		return nonZero & ((flags & 0x30) == (0x30 if self.phase else 0x20))
+
+	def getSegmentView(self, index: int) -> np.ndarray:
+		"""
+		Gets the 'index'th segment of this stripe's directory as rows of five `uint16_t`s.
+
+		This is a view onto `self.directory`, so nothing is copied and no `DirEntry`s are
+		constructed.
+		"""
+		seglen = self.numDirEntries // self.numSegs
+		index *= seglen
+		return self.directory[index : index + seglen]
 
 	def getSegment(self, index: int) -> directory.Segment:
 		"""
@@ -500,11 +595,30 @@ class Stripe():
 		Think very carefully about whether or not this really what you want. For the vast
 		majority of applications, it's probably better to look for a specific Bucket instead,
 		since loading an entire segment into memory can be extremely expensive, both in terms
-		of speed and memory usage.
+		of speed and memory usage. If you only need the raw directory data, use `getSegmentView`.
 		"""
-		seglen = self.numDirEntries // self.numSegs
-		index *= seglen
-		return [directory.DirEntry(bytearray(d)) for d in self.directory[index : index + seglen]]
+		return [directory.DirEntry.fromRow(d) for d in self.getSegmentView(index)]
+
+	def getBucketView(self, segment: int, bucket: int) -> np.ndarray:
+		"""
+		Fetches the 'bucket'th bucket from the 'segment'th segment as rows of five `uint16_t`s.
+
+		Like `getSegmentView`, this is a view onto `self.directory`.
+		"""
+		index = 4*(segment * (self.numBuckets // self.numSegs) + bucket)
+
+		return self.directory[index : index + 4]
+
+	def getBuckets(self, segment: int, buckets: typing.Sequence[int]) -> np.ndarray:
+		"""
+		Fetches many buckets from the 'segment'th segment at once, given their indices within that
+		segment.
+
+		Returns an array of shape `(len(buckets), 4, 5)` - i.e. one `getBucketView` per bucket - which
+		(unlike `getBucketView`) is a copy of the directory data, not a view onto it.
+		"""
+		perSeg = self.numBuckets // self.numSegs
+		return self.directory.reshape(-1, 4, 5)[segment * perSeg + np.asarray(buckets)]
 
 	def getBucket(self, segment: int, bucket: int) -> directory.Bucket:
 		"""
@@ -515,9 +629,7 @@ class Stripe():
 		Only fetches valid directory entries - any directory with an offset
 		of 0 is returned as None to save space.
 		"""
-		index = 4*((segment * self.numSegs // self.numBuckets) + bucket)
-
-		return [directory.DirEntry(bytearray(d)) for d in self.directory[index : index + 4]]
+		return [directory.DirEntry.fromRow(d) for d in self.getBucketView(segment, bucket)]
 
 	def ctime(self) -> str:
 		"""
@@ -563,7 +675,7 @@ class Stripe():
 			dirent = arg0
 		elif isinstance(arg0, int) and isinstance(arg1, int) and isinstance(arg2, int):
 			try:
-				dirent = self.directory[arg0, arg1, arg2]
+				dirent = self[arg0, arg1, arg2]
 			except IndexError:
 				utils.log_exc("Stripe.fetch:")
 				return None
@@ -579,20 +691,22 @@ class Stripe():
 			return None
 
 
-		# Now read in the actual doc information
-		docbuff = bytearray(len(dirent))
-		with io.open(self.file, 'rb') as infile:
-
-			infile.seek(self.contentOffset + dirent.Offset)
-			infile.readinto(docbuff)
+		# Now read in the actual doc information, through a descriptor that stays open between calls
+		if self._fd is None:
+			self._fd = os.open(self.file, os.O_RDONLY)
+		docbuff = os.pread(self._fd, len(dirent), self.contentOffset + dirent.Offset)
+		ds = directory.Doc.sizeof
+		if len(docbuff) < ds:
+			utils.log("Stripe.fetch: DirEntry points past the end of the stripe's file! (", arg0, ")")
+			return None
 
-		newDoc = directory.Doc.from_buffer(docbuff[:directory.Doc.sizeof])
+		newDoc = directory.Doc.from_buffer_copy(docbuff)
 		if newDoc.magic != directory.Doc.MAGIC:
 			utils.log("Stripe.fetch: DirEntry does not point to a valid Doc! (",arg0,"->",newDoc,")")
 			return None
 
-		newDoc.setInfo(docbuff[directory.Doc.sizeof:newDoc.hlen])
-		newDoc.setData(docbuff[directory.Doc.sizeof+newDoc.hlen : len(newDoc)])
+		newDoc.setInfo(docbuff[ds:newDoc.hlen])
+		newDoc.setData(docbuff[ds+newDoc.hlen : len(newDoc)])
 
 		return newDoc
 	#pylint: enable=E0102
@@ -622,8 +736,8 @@ class Stripe():
 		# Read the entire thing at once (faster than incremental reads)
 		self.file.readinto(docbuff)
 
-		# Separate he doc header bytes from the rest
-		dhead = docbuff[ : directory.Doc.sizeof]
+		# Separate the doc header bytes from the rest (without copying them)
+		dhead = memoryview(docbuff)[ : directory.Doc.sizeof]
 
 		# Attempt doc header construction
 		try:
@@ -635,7 +749,7 @@ class Stripe():
 			# restore stream position
 			self.file.seek(oldpos)
 
-		docbuff = docbuff[doc.sizeof() : len(doc)]
+		docbuff = docbuff[doc.sizeof : len(doc)]
 
 		if doc.hlen > 0:
 			doc.setInfo(docbuff[ : doc.hlen])
@@ -652,17 +766,33 @@ class Stripe():
 
 		Returns the segment index, bucket index and directory index as a tuple (in that order).
 		Intended behaviour is such that `self.index(self[i, j, k])` returns `(i, j, k)`
-		Will raise an error only AFTER iterating across the entire (read) directory if `dirent`
-		is some object other than a `directory.Direntry`.
+		Entries are identified by all of their fields (see `INDEX_FIELDS`), and the mapping of
+		those to rows of the directory is built on the first call, after which lookups take
+		constant time. Only entries that are the same in every field can't be told apart, and for
+		those the first is found.
+		Raises an IndexError if `dirent` is not an in-use entry of this stripe's directory.
 		"""
-		for i, d in enumerate(self.directory):
-			if d is dirent:
-				segLocalIndex, seg = divmod(i, self.numSegs)
-				entry, bucket = divmod(segLocalIndex, 4)
-				return seg, bucket, entry
-		raise IndexError("DirEntry could not be located in stripe!")
+		if self._indexMap is None:
+			entries = directory.parseDirEntries(self.directory)
+
+			# Only in-use entries can be found, so only their keys are built
+			rows = np.flatnonzero(entries["_offset"])
+			keys = zip(*(entries[field][rows].tolist() for field in INDEX_FIELDS))
+
+			# Later entries never shadow earlier ones with the same key
+			self._indexMap = {}
+			for i, key in zip(rows.tolist(), keys):
+				self._indexMap.setdefault(key, i)
+
+		try:
+			i = self._indexMap[_indexKey(dirent)]
+		except (KeyError, AttributeError):
+			raise IndexError("DirEntry could not be located in stripe!") from None
+
+		seg, segLocalIndex = divmod(i, self.numDirEntries // self.numSegs)
+		bucket, entry = divmod(segLocalIndex, 4)
+		return seg, bucket, entry
 
-	@asyncio.coroutine
 	def storedObjects(self) -> typing.Generator[typing.Tuple[str, int], None, None]:
 		"""
 		Fetches the urls of all objects stored in the stripe.
@@ -673,13 +803,14 @@ class Stripe():
 		if self.objs:
 			yield from self.objs
 		else:
+			append = self.objs.append
 			for doc in self.firstDocs:
 				# not strictly accurate, but should be close, and I don't wanna fetch all of the
 				# earliest docs for every alternate.
 				sz = doc.totalLength
 				for a in doc.alternates:
 					url = a.requestURL()
-					self.objs.append((url, sz))
+					append((url, sz))
 					yield url, sz
 
 
@@ -689,49 +820,38 @@ class Stripe():
 	###           Parallel Reads (EXPERIMENTAL)          ###
 	###                                                  ###
 	########################################################
-	def parallelObjs(self, q: multiprocessing.Queue, dirPart: np.ndarray):
+	def _preadObjs(self, fd: int, dirPart: np.ndarray) -> typing.List[typing.Tuple[str, int]]:
 		"""
-		Renders the objects pointed to from `DirEntry`s in the given `dirPart`.
+		Renders the objects pointed to from `DirEntry`s in the given `dirPart`, reading from the
+		open file descriptor `fd`.
 
-		Rather than generate or return these objects, this method will assume that it is being
-		run in a sub-process (or thread) and will push these values into the given Queue, `q`.
+		Reads are done with `os.pread`, so this is safe to run in several threads sharing `fd` at
+		once, and releases the GIL while waiting on the disk.
 
-		When the assigned part of the directory has been exhausted, this method will put the special
-		`None` value into the Queue, signaling its termination.
+		Returns a list of the (url, size) pairs of the objects found.
 		"""
-		fd = io.open(self.file, 'rb')
-		ds, dm, cm = directory.Doc.sizeof, directory.Doc.MAGIC, directory.Doc.CORRUPT_MAGIC
-		try:
-			for d in dirPart:
-				docbuff = bytearray(directory.dirSize(d))
-				try:
-					fd.seek(self.contentOffset + directory.dirOffset(d))
-				except OSError:
-					utils.log_exc("Stripe.parallelObjs: (was looking at %X)" %\
-					                         (self.contentOffset + directory.dirOffset(d)))
-					continue
-				fd.readinto(docbuff)
-
-				doc = directory.Doc.from_buffer(docbuff[:ds])
-
-				if doc.magic == dm and doc.hlen > 0:
-					try:
-						doc.setInfo(docbuff[ds : doc.hlen])
-						doc.setData(docbuff[ds + doc.hlen : len(doc)])
-					except struct.error as e:
-						utils.log("Stripe.parallelObjs: Error reading doc pointed to by", d, ':', e)
-						utils.log_exc("Stripe.parallelObjs:")
-					else:
-						sz = doc.totalLength
-						for a in doc.alternates:
-							url = a.requestURL()
-							q.put((url, sz))
-				elif doc.magic == cm:
-					utils.log("Stripe.parallelObjs: Corrupt Doc pointed to by", d, ':', doc)
-		finally:
-			fd.close()
-			q.put(None)
+		fromBuffer = directory.Doc.fromBuffer
+		objs = []
 
+		# Reading in on-disk order keeps reads as sequential as possible (see `firstDocs`), and
+		# the upcoming reads are started early so that the disk is kept busy during parsing.
+		offsets = directory.dirOffsets(dirPart) + self.contentOffset
+		order = offsets.argsort(kind="mergesort")
+		dirPart = dirPart[order]
+		reads = utils.readAhead(fd, offsets[order].tolist(), directory.dirSizes(dirPart).tolist())
+		for d, (offset, size) in zip(dirPart, reads):
+			try:
+				docbuff = os.pread(fd, size, offset)
+			except OSError:
+				utils.log_exc("Stripe._preadObjs: (was looking at %X)" % (offset,))
+				continue
+
+			doc = fromBuffer(docbuff, len(docbuff), d)
+			if doc is not None:
+				sz = doc.totalLength
+				objs.extend((a.requestURL(), sz) for a in doc.alternates)
+
+		return objs
 
 	def parallelStoredObjects(self):
 		"""
@@ -740,8 +860,10 @@ class Stripe():
 		This method aims to do exactly the same thing as self.storedObjects, but by doing reads in
 		parallel.
 		It does, however, respect the configuration's maximum-allowed loadavg and will only use
-		subprocesses if the configuration reports that this is permissible. If not, it will fall
+		extra workers if the configuration reports that this is permissible. If not, it will fall
 		back on `self.storedObjects`.
+		Reads are done by threads sharing one file descriptor (see `_preadObjs`), and the objects
+		are yielded in the same order every time.
 		"""
 
 		# Yield cached objects if they exist.
@@ -759,21 +881,14 @@ class Stripe():
 
 
 		# I'm going to just ignore things that are out-of-phase for now
-		heads = self.directory[\
-		                          self.directory[:,0] + \
-		                          self.directory[:,4] + \
-		                          (self.directory[:,1] & 0xFF)\
-		                      > 0]
+		if self._headsMask is None:
+			self._headsMask = self.headsMask()
+		heads = self.directory[self._headsMask]
 
 		# Sometimes, nothing is cached
-		if not heads.any():
+		if heads.size == 0:
 			return
 
-		if self.phase:
-			heads = heads[heads[:,2] & 0x3000 == 0x3000]
-		else:
-			heads = heads[(heads[:,2] & 0x3000) ^ 0x2000 == 0]
-
 		sliceSize = len(heads) // numprocs
 
 		# If there's fewer heads than available processes, then we can probably get away
@@ -789,67 +904,68 @@ class Stripe():
 		          len(heads),
 		          "heads into",
 		          numprocs,
-		          "processes")
-
-		m = multiprocessing.Manager()
-		q = m.Queue()
-
-		# I pre-slice the directory partly to avoid issues when len(self.directory) % numprocs > 0
-		# and partly to handle passing the Queue to the child processes.
-		slicedDir = [(q, heads[i:i+sliceSize]) for i in range(0, (numprocs-1)*sliceSize, sliceSize)]
-		slicedDir.append((q, heads[(numprocs - 1) * sliceSize:]))
+		          "threads")
 
-		pool = multiprocessing.Pool(processes=numprocs)
-
-		pool.starmap_async(self.parallelObjs, slicedDir, error_callback=utils.log)
-		pool.close()
+		# I pre-slice the directory to avoid issues when len(self.directory) % numprocs > 0
+		slicedDir = [heads[i:i+sliceSize] for i in range(0, (numprocs-1)*sliceSize, sliceSize)]
+		slicedDir.append(heads[(numprocs - 1) * sliceSize:])
 
+		# Every thread reads from the same descriptor with `os.pread`, which never moves the
+		# file position, so no locking is needed.
+		fd = os.open(self.file, os.O_RDONLY)
 		try:
-			count = 1
-			while count < numprocs:
-				val = q.get()
-				if val is None:
-					count += 1
-				else:
-					self.objs.append(val)
-					yield val
+			with concurrent.futures.ThreadPoolExecutor(max_workers=numprocs) as pool:
+				# Results are taken in the order the jobs were submitted, not as they finish
+				for job in [pool.submit(self._preadObjs, fd, part) for part in slicedDir]:
+					objs = job.result()
+					self.objs.extend(objs)
+					yield from objs
 		finally:
-			pool.join()
-
+			os.close(fd)
 
 
-
-def SORdirSize(start: int, length: int) -> typing.Tuple[int, int, int]:
+def SORdirSize(start: int, length: int, avgObjSize: int = None) -> typing.Tuple[int, int, int]:
 	"""
 	This function uses the Successive Over-Relaxation technique to find the
 	content offset, segment count, and bucket count of a stripe.
 
+	If `avgObjSize` isn't given, it's read from the ATS configuration (defaulting to 8000).
+
 	Returns (in order): the bucket count (per segment), the segment count, and
 	the content offset of the stripe with the given starting offset and length.
 	"""
-	from . import config
-	configuration = config.settings()
-	avgObjSize = configuration.get("cache.min_average_object_size", 8000)
+	if avgObjSize is None:
+		avgObjSize = _avgObjSize()
 
-	def singleStep(buckets: int, segs: int, content: int) -> typing.Tuple[int, int, int]:
-		"""
-		Represents a single step in the iterative Successive Over-Relaxation
-		"""
-		nonlocal length, start, avgObjSize
+	return _SORdirSize(start, length, avgObjSize)
 
-		buckets = (length - content + start) // (4 * avgObjSize)
+@functools.lru_cache(maxsize=4096)
+def _SORdirSize(start: int, length: int, avgObjSize: int) -> typing.Tuple[int, int, int]:
+	"""
+	Does the actual work of `SORdirSize`, whose results depend only on its arguments and so are
+	cached.
+	"""
+	# I'm told three times is sufficient for this. Don't ask me.
+	_, _, content = _SORstep(start, start, length, avgObjSize)
+	_, _, content = _SORstep(content, start, length, avgObjSize)
+	return _SORstep(content, start, length, avgObjSize)
 
-		segs = -(-buckets // 0x4000)
+def _SORstep(content: int, start: int, length: int, avgObjSize: int) -> typing.Tuple[int, int, int]:
+	"""
+	Represents a single step in the iterative Successive Over-Relaxation
 
-		buckets = -(-buckets // segs)
+	Only the content offset carries over from one step to the next; the bucket and segment counts
+	are recomputed from it each time.
+	"""
+	buckets = (length - content + start) // (4 * avgObjSize)
 
-		content = start + 16384 * ( -(-(34 + segs) // 4096) - (-5 * buckets * segs // 1024) + 1 )
+	segs = -(-buckets // 0x4000)
 
-		return buckets, segs, content
+	buckets = -(-buckets // segs)
 
+	content = start + 16384 * ( -(-(34 + segs) // 4096) - (-5 * buckets * segs // 1024) + 1 )
 
-	# I'm told three times is sufficient for this. Don't ask me.
-	return singleStep(*singleStep(*singleStep(0, 0, start)))
+	return buckets, segs, content
 
 utils.log("'stripe' module: Loaded")
 utils.log("\t\tSpan Block Header size:", SpanBlockHeader.sizeof)
@@ -20,6 +20,12 @@ import typing
 import sys
 import re
 import os
+import functools
+import collections
+import operator
+import bisect
+import heapq
+import time
 try:
 	import readline
 except ImportError:
@@ -31,22 +37,109 @@ except ImportError:
 		      " https://github.com/Comcast/Superior-Cache-ANalyzer", file=sys.stderr)
 import glob
 
+import numpy as np
+
 from . import config, utils
 
 # ANSI control sequence that clears the screen
 CLEAR = "\033[H\033[J"
 
-def byteSized(size: int) -> str:
+# The minimum time (in seconds) between updates of the progress shown while scanning a span
+PROGRESS_INTERVAL = 0.25
+
+# Tabular YAML templates for the usage of a single object, and of a single host, respectively.
+# Each one is filled in with a single `%`, which measures faster than joining its pieces together.
+OBJECT_USAGE = "\t%s:\n\t\tsize: %d\n\t\tnum: %d\n"
+HOST_USAGE = "%s:\n\t\tDocs: %d\n\t\tTotalSize: %s\n\t\tPercentOfAvailableSpace: "\
+             "%1.2f%%\n\t\tPercentOfUsedSpace: %1.2f%%"
+
+# Gets the total size from one of the (key, count, total size) tuples returned by `tally`
+TOTAL_SIZE = operator.itemgetter(2)
+
+# The units used by `byteSized`, as (divisor, format, next unit's threshold) triples. Each unit is
+# used for sizes up to 999 of it, and gigabytes are used for anything larger than that.
+BYTE_UNITS = ((1, "%dB", 999),
+              (0x400, "%1.1fkB", 999 * 0x400),
+              (0x100000, "%1.1fMB", 999 * 0x100000),
+              (0x40000000, "%1.2fGB", float("inf")))
+
+def byteSized(size: int, _units: tuple = BYTE_UNITS) -> str:
 	"""
 	Takes a size (in bytes) given by 'size' and returns a human-readable measure of the same number
 	"""
-	if size < 999:
-		return "%dB" % size
-	if size / 0x400 < 999:
-		return "%1.1fkB" % (size/0x400)
-	if size / 0x100000 < 999:
-		return "%1.1fMB" % (size/0x100000)
-	return "%1.2fGB" % (size/0x40000000)
+	# Every 10 bits is another factor of 1024, so this is the largest unit that is at most `size`.
+	# Because units are only used for up to 999 of themselves, it might still need to be bumped up.
+	# (`size` may also be a float or a NumPy integer, neither of which has a `bit_length`)
+	unit = min(max(int(size).bit_length() - 1, 0) // 10, 3)
+	if size >= _units[unit][2]:
+		unit += 1
+
+	divisor, fmt, _ = _units[unit]
+	return fmt % (size / divisor) if unit else fmt % size
+
+def byteSizedMany(sizes: typing.Sequence[int], _units: tuple = BYTE_UNITS) -> typing.List[str]:
+	"""
+	Does the same thing as `byteSized`, but for every size in `sizes` at once.
+
+	The unit of each size is picked by NumPy, after which each unit's sizes are scaled and formatted
+	together, so the per-size cost is little more than the string formatting itself.
+	"""
+	sizes = np.asarray(sizes, dtype=np.int64)
+	units = np.digitize(sizes, [threshold for _, _, threshold in _units[:-1]])
+	result = np.empty(len(sizes), dtype=object)
+
+	for unit, (divisor, fmt, _) in enumerate(_units):
+		which = units == unit
+		if which.any():
+			scaled = (sizes[which] / divisor if unit else sizes[which]).tolist()
+			result[which] = [fmt % size for size in scaled]
+
+	return result.tolist()
+
+@functools.lru_cache(maxsize=256)
+def _compile(pattern: str) -> typing.Pattern:
+	"""
+	Compiles the regular expression `pattern`, re-using the result for repeated searches.
+	"""
+	return re.compile(pattern)
+
+def tally(keys: typing.Sequence[object],
+          sizes: typing.Sequence[int]) -> typing.List[typing.Tuple[object, int, int]]:
+	"""
+	Counts the occurrences of each distinct key in `keys`, and totals the sizes in `sizes` that
+	correspond to them.
+
+	The counting and summing are done by NumPy, rather than by a Python loop over every object.
+	Returns a list of (key, count, total size) tuples, in the order in which each key first appears.
+	"""
+	# (plain dicts only keep insertion order from Python 3.7 on)
+	firsts = collections.OrderedDict.fromkeys(keys)
+	if not firsts:
+		return []
+
+	index = {k: i for i, k in enumerate(firsts)}
+	inverse = np.fromiter(map(index.__getitem__, keys), dtype=np.intp, count=len(keys))
+	counts = np.bincount(inverse, minlength=len(index))
+
+	# Sizes are summed as integers, since float weights could lose precision on large totals. Once
+	# each key's sizes are next to one another, they can all be summed at once.
+	grouped = np.asarray(sizes, dtype=np.int64)[inverse.argsort(kind="mergesort")]
+	totals = np.add.reduceat(grouped, np.cumsum(counts) - counts)
+	return list(zip(firsts, counts.tolist(), totals.tolist()))
+
+def countFirst(keys: typing.Sequence[object],
+               sizes: typing.Sequence[int]) -> typing.List[typing.Tuple[object, int, int]]:
+	"""
+	Counts the occurrences of each distinct key in `keys`, alongside the size of its first
+	occurrence.
+
+	Returns a list of (key, size, count) tuples, in the order in which each key first appears.
+	"""
+	counts = collections.Counter(keys)
+
+	# Building this from the end means that earlier occurrences overwrite later ones
+	firstSizes = dict(zip(reversed(keys), reversed(sizes)))
+	return [(k, firstSizes[k], n) for k, n in counts.items()]
 
 def setCompleter(words: typing.Set[str]):
 	"""
@@ -55,17 +148,23 @@ def setCompleter(words: typing.Set[str]):
 
 	matches = []
 
+	# Words starting with some prefix are all next to one another once sorted, so they can be
+	# found with a binary search instead of checking every word on each completion.
+	words = sorted(words)
+
 	def complete(text: str, state: int) -> str:
 		"""
 		Gets the `state`th completion for `text`
 		"""
-		nonlocal matches, words
+		nonlocal matches
 
 		if state == 0:
 			if text:
-				matches = [word for word in words if word.startswith(text)]
+				lo = bisect.bisect_left(words, text)
+				hi = bisect.bisect_right(words, text + chr(sys.maxunicode), lo)
+				matches = words[lo:hi]
 			else:
-				matches = [word for word in words]
+				matches = words
 
 		return matches[state]
 
@@ -78,7 +177,20 @@ def setGlobCompleter():
 	Sets tab completion to operate on the filesystem
 	"""
 
-	complete = lambda t,s: [x for x in glob.glob(t+"*")][s] if t else None
+	matches = []
+
+	def complete(text: str, state: int) -> str:
+		"""
+		Gets the `state`th completion for `text`
+		"""
+		nonlocal matches
+
+		# readline asks for each completion in turn, but the filesystem only needs to be
+		# searched for the first one.
+		if state == 0:
+			matches = glob.glob(text + '*') if text else []
+
+		return matches[state] if state < len(matches) else None
 
 	readline.set_completer(complete)
 	readline.set_completer_delims(' \t\n;')
@@ -88,7 +200,7 @@ def loadConfig(confDir: str):
 	"""
 	Attempts to load the configuration from 'confDir'.
 	"""
-	global MENU_ENTRIES, CLEAR
+	global MENU_ENTRIES, MENU_TEXT, CLEAR
 
 	utils.log('ui.loadConfig: attempting to read config from', confDir)
 
@@ -110,13 +222,8 @@ def loadConfig(confDir: str):
 		print("Error in config file - cache not found: %s" % e, file=sys.stderr)
 	else:
 		del MENU_ENTRIES[0]
-		MENU_ENTRIES.append(("Show Cache Setup", printCache))
-		MENU_ENTRIES.append(("List Settings", printConfig))
-		MENU_ENTRIES.append(("Search for Setting", searchSetting))
-		MENU_ENTRIES.append(("List Stripes in a Span", listSpanStripes))
-		MENU_ENTRIES.append(("View URLs of objects in a Span", listSpanURLs))
-		MENU_ENTRIES.append(("View usage of a Span broken down by host", spanUsageByHost))
-		MENU_ENTRIES.append(("Dump cache usage stats to file (Tabular YAML format)", dumpUsageToFile))
+		MENU_ENTRIES.extend(_POST_LOAD_ENTRIES)
+		MENU_TEXT = menuText(MENU_ENTRIES)
 		print(CLEAR)
 
 
@@ -125,7 +232,7 @@ def getConfig():
 	Gets the location of the storage.conf file from the user,
 	then reads and parses it using the 'storage' module.
 	"""
-	global MENU_ENTRIES, CLEAR
+	global MENU_ENTRIES, MENU_TEXT, CLEAR
 
 	setGlobCompleter()
 
@@ -151,13 +258,8 @@ def getConfig():
 			print("Error in config file - cache not found: %s" % e, file=sys.stderr)
 		else:
 			del MENU_ENTRIES[0]
-			MENU_ENTRIES.append(("Show Cache Setup", printCache))
-			MENU_ENTRIES.append(("List Settings", printConfig))
-			MENU_ENTRIES.append(("Search for Setting", searchSetting))
-			MENU_ENTRIES.append(("List Stripes in a Span", listSpanStripes))
-			MENU_ENTRIES.append(("View URLs of objects in a Span", listSpanURLs))
-			MENU_ENTRIES.append(("View usage of a Span broken down by host", spanUsageByHost))
-			MENU_ENTRIES.append(("Dump cache usage stats to file (Tabular YAML format)", dumpUsageToFile))
+			MENU_ENTRIES.extend(_POST_LOAD_ENTRIES)
+			MENU_TEXT = menuText(MENU_ENTRIES)
 
 def printConfig():
 	"""
@@ -196,7 +298,7 @@ def searchSetting():
 		if choice.lower() == 'q':
 			break
 		elif choice.lower() == 'l':
-			for setting in config.settings():
+			for setting in settings:
 				print(setting)
 			continue
 
@@ -206,10 +308,10 @@ def searchSetting():
 
 		matches = []
 		try:
-			regex = re.compile(".*%s.*" % choice)
+			regex = _compile(choice)
 			matches = [(setting, settings[setting])\
 			           for setting in settings\
-			           if regex.match(setting) is not None]
+			           if regex.search(setting) is not None]
 		except re.error:
 			print("Not a valid regex: '%s' !" % choice, file=sys.stderr)
 		else:
@@ -268,7 +370,7 @@ def listSpanStripes():
 
 
 		elif choice.lower() == 'l':
-			for location in config.spans():
+			for location in caches:
 				print(location)
 			print()
 
@@ -299,19 +401,24 @@ def listSpanURLs() -> str:
 		elif choice.lower() == 'q':
 			return ''
 		elif choice in spans:
-			urls = {}
-			for i, obj in enumerate(spans[choice][1].storedObjects()):
-				if obj[0] not in urls:
-					urls[obj[0]] = [byteSized(obj[1]), 0]
-				urls[obj[0]][1] += 1
-
-				# 127 is pretty arbitrary, but it should keep the numbers different enough that
-				# nobody will suspect it's not updating on every iteration
-				if i % 127 == 0:
-					print("\033[K\033[H%d objects found so far..." % i)
+			urls, sizes = [], []
+			nextUpdate = 0
+			for i, (url, sz) in enumerate(spans[choice][1].storedObjects()):
+				urls.append(url)
+				sizes.append(sz)
 
-			return '\n'.join("%s\t - %s - \tx%d" % (k, v[0], v[1]) for k, v in urls.items())\
-			           if urls else "No URLs found!"
+				# Writing to the terminal costs far more than scanning an object, so progress is
+				# only shown a few times a second - and the clock is only checked every 1024 objects
+				if not i & 0x3FF and time.monotonic() >= nextUpdate:
+					print("\033[K\033[H%d objects found so far..." % i)
+					nextUpdate = time.monotonic() + PROGRESS_INTERVAL
+
+			if not urls:
+				return "No URLs found!"
+			usage = countFirst(urls, sizes)
+			sized = byteSizedMany([sz for _, sz, _ in usage])
+			return '\n'.join("%s\t - %s - \tx%d" % (k, sz, n)\
+			                 for (k, _, n), sz in zip(usage, sized))
 		else:
 			print("Please enter a valid span.\n", file=sys.stderr)
 
@@ -340,37 +447,42 @@ def spanUsageByHost() -> str:
 			return ''
 
 		elif choice in spans:
-			hosts = {}
+			hosts, sizes = [], []
+			nextUpdate = 0
 
 			fmt = "%s\t - %s - \t%1.2f%% of available space - \t%1.2f%% of used space"
 
 			for i, (url, sz) in enumerate(spans[choice][1].storedObjects()):
-				if url.host not in hosts:
-					hosts[url.host] = 0
-				hosts[url.host] += sz
+				hosts.append(url.host)
+				sizes.append(sz)
 
 				# print our progress
-				if i % 127 == 0:
+				if not i & 0x3FF and time.monotonic() >= nextUpdate:
 					print("\033[K\033[H%d objects found so far..." % i)
+					nextUpdate = time.monotonic() + PROGRESS_INTERVAL
 
 			print(CLEAR)
 
-			total = sum(hosts.values())
-
 			if hosts:
-				return '\n'.join(fmt % (k, byteSized(v), v/spans[choice][0], 100*v/total)\
-			    	   for k, v in hosts.items())
+				usage = tally(hosts, sizes)
+				total = sum(v for _, _, v in usage)
+				sized = byteSizedMany([v for _, _, v in usage])
+				return '\n'.join(fmt % (k, sz, v/spans[choice][0], 100*v/total)\
+			    	   for (k, _, v), sz in zip(usage, sized))
 			return "No URLs found!"
 
 def dumpUsageToFile():
 	"""
 	Dumps all usage information to a file.
 
-	So far, operates on all spans sequentially. Should
-	eventually do all simultaneously, but w/e.
+	Spans are scanned one after another in this process (though each one's stripes are still read
+	in parallel), so that the objects found are kept for later queries. Each span's output is
+	written all at once, as soon as it has been scanned.
 	"""
 	global CLEAR
 
+	spans = sorted(config.spans().items())
+
 	while True:
 		choice = input("Enter a file name to save to (or 'q' to go back): ")
 
@@ -386,23 +498,21 @@ def dumpUsageToFile():
 			print("File already exists!", file=sys.stderr)
 		else:
 			try:
-				with open(choice, 'w') as f:
+				with open(choice, 'w', buffering=0x100000) as f:
 					f.write("%TYAML 1.1\n---\n")
-					for file, (_, s) in sorted(config.spans().items()):
+					for file, (_, s) in spans:
 						print("Working on %s..." % file)
-						f.write(file)
-						f.write(':')
-						objs = {}
-						for obj in s.storedObjects():
-							if obj[0] not in objs:
-								objs[obj[0]] = [obj[1], 0]
-							objs[obj[0]][1] += 1
-						if objs:
-							f.write('\n')
-							for obj, val in objs.items():
-								f.write("\t%s:\n\t\tsize: %d\n\t\tnum: %d\n" % (obj, val[0], val[1]))
+						urls, sizes = [], []
+						for url, sz in s.storedObjects():
+							urls.append(url)
+							sizes.append(sz)
+
+						if urls:
+							chunks = ["%s:\n" % file]
+							chunks.extend(OBJECT_USAGE % obj for obj in countFirst(urls, sizes))
+							f.write(''.join(chunks))
 						else:
-							f.write(" None\n")
+							f.write("%s: None\n" % file)
 						print(CLEAR)
 				return "Done!"
 			except OSError as e:
@@ -427,7 +537,7 @@ def nonInteractiveDump():
 	# Supposedly, local var lookup is much faster than global, so this should boost performance
 	append = buffer.append
 	clear = buffer.clear
-	output = lambda x: print(*x, sep='\n')
+	write = sys.stdout.write
 	bs = byteSized
 
 	try:
@@ -436,13 +546,15 @@ def nonInteractiveDump():
 			append("%s:" % file)
 			for url, sz in s.storedObjects():
 				append("\t%s: %s" % (url, bs(sz)))
-			output(buffer)
+			write('\n'.join(buffer))
+			write('\n')
 			clear()
 	except KeyboardInterrupt:
 		# Terminate gracefully when requested.
 		print("Warning, job terminated early! Quitting...", file=sys.stderr)
 		if buffer:
-			output(buffer)
+			write('\n'.join(buffer))
+			write('\n')
 
 def dumpSingleSpan(spanFile: str) -> int:
 	"""
@@ -455,42 +567,48 @@ def dumpSingleSpan(spanFile: str) -> int:
 		print("Error: '%s' is not a cache span!" % spanFile, file=sys.stderr)
 		return 1
 
-	print("%TYAML 1.1")
-	print("---")
-	print(spanFile, ':', sep='')
+	write = sys.stdout.write
+	write("%%TYAML 1.1\n---\n%s:\n" % spanFile)
 
 	bs = byteSized
 	try:
 		for url, sz in spans[spanFile][1].storedObjects():
-			print("\t%s: %s" % (url, bs(sz)))
+			write("\t%s: %s\n" % (url, bs(sz)))
 	except KeyboardInterrupt:
 		print("Warning, job terminated early! Quitting...", file=sys.stderr)
 		return 2
 	return 0
 
-def spanUsageByHostDump(c: config.Cache) -> str:
+def spanUsageByHostDump(c: config.Cache, top: int = None) -> str:
 	"""
 	Returns a Tabular YAML-formatted representation of the cache `c`'s usage, broken down
 	by host.
 
+	If `top` is given, only that many of the hosts using the most space are included.
 	Does NOT include the TYAML header.
 	Uses no base indentation level.
 	"""
-	hosts = {}
-	fmt = "%s:\n\t\tDocs: %d\n\t\tTotalSize: %s\n\t\tPercentOfAvailableSpace: "\
-	      "%1.2f%%\n\t\tPercentOfUsedSpace: %1.2f%%"
-
+	hosts, sizes = [], []
 	for url, sz in c[1].storedObjects():
-		if url.host not in hosts:
-			hosts[url.host] = [0, 0]
-		hosts[url.host][0] += 1
-		hosts[url.host][1] += sz
+		hosts.append(url.host)
+		sizes.append(sz)
+
+	if not hosts:
+		return ''
+
+	usage = tally(hosts, sizes)
+
+	total = sum(s for _,_,s in usage)
 
-	total = sum(s for _,s in hosts.values())
+	# Only the largest few need to be ordered when that's all that is wanted
+	if top is None:
+		usage.sort(key=TOTAL_SIZE, reverse=True)
+	else:
+		usage = heapq.nlargest(top, usage, key=TOTAL_SIZE)
+	sized = byteSizedMany([s for _,_,s in usage])
 
-	hosts = [fmt % (h, n, byteSized(s), 100.0*s/c[0], 100.0*s/total)\
-	         for h,(n,s) in\
-	         sorted(hosts.items(), key=lambda x: x[1][1], reverse=True)]
+	hosts = [HOST_USAGE % (h, n, sz, 100.0*s/c[0], 100.0*s/total)\
+	         for (h,n,s), sz in zip(usage, sized)]
 
 	return '\n'.join(hosts)
 
@@ -524,9 +642,31 @@ def breakDownDump(spanFile: str = None):
 		return 2
 	return 0
 
+def menuText(entries: typing.List[typing.Tuple[str, typing.Callable]]) -> str:
+	"""
+	Returns the text of a menu made up of `entries`, as (description, action) pairs.
+
+	The entries only change when the configuration is loaded, so this needn't be done for every
+	display of the menu.
+	"""
+	lines = ["Choose an option (or option number)\n\n"]
+	lines.extend("[%d] %s\n" % (index+1, entry[0]) for index, entry in enumerate(entries))
+	lines.append('\n')
+	return ''.join(lines)
+
 
 MENU_ENTRIES = [("Read Storage config", getConfig)]
 
+# The entries that replace "Read Storage config" once a configuration has been loaded
+_POST_LOAD_ENTRIES = (("Show Cache Setup", printCache),
+                      ("List Settings", printConfig),
+                      ("Search for Setting", searchSetting),
+                      ("List Stripes in a Span", listSpanStripes),
+                      ("View URLs of objects in a Span", listSpanURLs),
+                      ("View usage of a Span broken down by host", spanUsageByHost),
+                      ("Dump cache usage stats to file (Tabular YAML format)", dumpUsageToFile))
+MENU_TEXT = menuText(MENU_ENTRIES)
+
 def mainmenu(confDir: str = None):
 	"""
 	The UI's main menu, which executes ui and library functions based on user input
@@ -541,10 +681,7 @@ def mainmenu(confDir: str = None):
 	while True:
 		# Sets up tab completion for the Main Menu
 		# setCompleter({entry[0] for entry in MENU_ENTRIES})
-		print("Choose an option (or option number)\n")
-		for index, entry in enumerate(MENU_ENTRIES):
-			print("[%d] %s" % (index+1, entry[0]))
-		print()
+		sys.stdout.write(MENU_TEXT)
 
 		choice = input("(option, or use ^C or ^D to quit): ")
 
@@ -553,7 +690,7 @@ def mainmenu(confDir: str = None):
 
 		try:
 			choice = int(choice)-1
-			if choice in range(len(MENU_ENTRIES)):
+			if 0 <= choice < len(MENU_ENTRIES):
 				output = MENU_ENTRIES[choice][1]()
 				if output:
 					print(output)
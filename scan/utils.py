@@ -17,10 +17,13 @@ This module contains miscellaneous utilities
 """
 
 import os
+import stat
 import sys
 import struct
 import enum
-import psutil
+import functools
+import typing
+import time
 
 ########################################################
 ###                                                  ###
@@ -38,6 +41,9 @@ STORE_BLOCK_SIZE = 8192
 # So it's used to check validity of a span block
 VOL_BLOCK_SIZE = 0x8000000
 
+# How many reads ahead of the current one `readAhead` asks the kernel to start on
+READ_AHEAD = 64
+
 
 ########################################################
 ###                                                  ###
@@ -57,7 +63,10 @@ class CacheType(enum.IntEnum):
 		"""
 		Returns the human-readable form of a cache type
 		"""
-		return str(self.name).lower()
+		return _CACHETYPE_STR[self]
+
+# The human-readable forms of each cache type, built once rather than on every `str`
+_CACHETYPE_STR = {cacheType: cacheType.name.lower() for cacheType in CacheType}
 
 
 ########################################################
@@ -74,28 +83,67 @@ def fileSize(fname: str) -> int:
 	0 file size; this will get the size of the disk by opening it and seeing how far you
 	have to go to get to the end of the file.
 	"""
-	global log
 	log("fileSize: getting size of", fname)
+
+	# Regular files know their own size, so there's no need to open them
+	st = os.stat(fname)
+	if stat.S_ISREG(st.st_mode):
+		log("fileSize: size of", fname, "is", st.st_size)
+		return st.st_size
+
 	fd = os.open(fname, os.O_RDONLY)
 	log("fileSize: fd of", fname, "is", fd)
 	try:
 		size = os.lseek(fd, 0, os.SEEK_END)
 		log("fileSize: size of", fname, '(', fd, ") is", size)
-		return os.lseek(fd, 0, os.SEEK_END)
+		return size
 	except OSError as e:
 		print("fileSize: e", file=sys.stderr)
 		if __debug__:
-			from traceback import print_exc
+			from traceback import print_exc #pylint: disable=C0415
 			print_exc(file=sys.stderr)
 	finally:
 		os.close(fd)
 
+def readAhead(fd: int,
+              offsets: typing.List[int],
+              sizes: typing.List[int]) -> typing.Generator[typing.Tuple[int, int], None, None]:
+	"""
+	Yields the (offset, size) pairs of the reads from `fd` given by `offsets` and `sizes`, in order.
+
+	Each time a pair is yielded, the kernel is advised that the read `READ_AHEAD` pairs later will
+	be needed soon, so it can be fetched from the disk in the background while the earlier ones are
+	being parsed. Where `os.posix_fadvise` isn't available, the pairs are simply yielded.
+	"""
+	reads = list(zip(offsets, sizes))
+	advise = getattr(os, "posix_fadvise", None)
+
+	if advise is not None:
+		willNeed = os.POSIX_FADV_WILLNEED
+		try:
+			for offset, size in reads[:READ_AHEAD]:
+				advise(fd, offset, size, willNeed)
+		except OSError:
+			log_exc("readAhead: Can't advise the kernel about reads from %d" % fd)
+			advise = None
+
+	for i, read in enumerate(reads):
+		if advise is not None and i + READ_AHEAD < len(reads):
+			offset, size = reads[i + READ_AHEAD]
+			advise(fd, offset, size, willNeed)
+		yield read
+
 def align(alignMe: int, alignTo: int = STORE_BLOCK_SIZE) -> int:
 	"""
 	Aligns an offset `alignMe` to the storage size indicated by `alignTo`
 
 	Returns `alignMe` unchanged if it is alreadly properly aligned.
 	"""
+	mask = alignTo - 1
+
+	# Block sizes are nearly always powers of two, which can be aligned to by masking
+	if not alignTo & mask:
+		return (alignMe + mask) & ~mask
 
 	x = alignMe % alignTo
 
@@ -104,16 +152,31 @@ def align(alignMe: int, alignTo: int = STORE_BLOCK_SIZE) -> int:
 def numProcs() -> int:
 	"""
 	Gets the number of processes currently running on the system.
+
+	Counting them means listing all of '/proc', so the count is re-used for up to a second.
+	"""
+	return _countProcs(int(time.monotonic()))
+
+@functools.lru_cache(maxsize=1)
+def _countProcs(unused_second: int) -> int:
 	"""
-	global log
-	num = len(psutil.pids())
+	Counts the processes currently running on the system. The argument only serves to expire the
+	cached count.
+	"""
+	# Every running process has a directory named for its PID in '/proc', where there is one.
+	# psutil is only needed (and so only imported) where there isn't.
+	try:
+		num = sum(1 for entry in os.listdir('/proc') if entry.isdigit())
+	except OSError:
+		import psutil #pylint: disable=C0415
+		num = len(psutil.pids())
+
 	log("numProcs:", num)
-	return len(psutil.pids())
+	return num
 
 if __debug__:
-	from traceback import format_exc
-
-	if os.isatty(sys.stderr.fileno()):
+	# (stderr may have been replaced with something that isn't a file, so this doesn't use `fileno`)
+	if sys.stderr.isatty():
 		messageTemplate = "\033[38;2;174;129;255mDEBUG: %s\033[0m\n"
 	else:
 		messageTemplate = "DEBUG: %s\n"
@@ -121,13 +184,14 @@ if __debug__:
 		"""
 		This will output debug info to stderr (but only if __debug__ is true)
 		"""
-		output = tuple(repr(arg) if not isinstance(arg, str) else arg for arg in args)
-		sys.stderr.write(messageTemplate % (' '.join(output),))
+		output = ' '.join([arg if isinstance(arg, str) else repr(arg) for arg in args])
+		sys.stderr.write(messageTemplate % output)
 
 	def log_exc(desc: str):
 		"""
 		Logs an exception with a description
 		"""
+		from traceback import format_exc #pylint: disable=C0415
 		log(desc, format_exc().replace('\n', "\nDEBUG:\t"))
 
 	log("'utils' module: Loaded")
@@ -23,6 +23,8 @@ import struct
 import os
 import sys
 import argparse
+import tempfile
+import operator
 
 
 try:
@@ -31,15 +33,46 @@ except ImportError as e:
 	print("Tests should be run from the project's root directory (or while it's installed)! (%s)" % e, file=sys.stderr)
 	exit(1)
 
-DISK_HEADER_SIZE = struct.calcsize("5IQ")
-SPAN_BLOCK_HEADER_SIZE = struct.calcsize("4IiII")
+DISK_HEADER_STRUCT = struct.Struct("5IQ")
+SPAN_BLOCK_HEADER_STRUCT = struct.Struct("4IiII")
+DIR_ENTRY_STRUCT = struct.Struct("HHHHH")
+
+DISK_HEADER_SIZE = DISK_HEADER_STRUCT.size
+SPAN_BLOCK_HEADER_SIZE = SPAN_BLOCK_HEADER_STRUCT.size
 SPAN_BLOCK_HEADER_LENGTH = 0x4000 * utils.STORE_BLOCK_SIZE
 
 # offset: 4294967296
 # length: 4294967296
-rawSpanBlockHeader = struct.pack("4IiII", 0, 1, 0, 1, 1, 1, 0)
-
-rawDirEntry = struct.pack("HHHHH", 0xA000, 0, 0x2FFF, 0, 0)
+rawSpanBlockHeader = SPAN_BLOCK_HEADER_STRUCT.pack(0, 1, 0, 1, 1, 1, 0)
+
+rawDirEntry = DIR_ENTRY_STRUCT.pack(0xA000, 0, 0x2FFF, 0, 0)
+
+# The attributes checked by `testStripe`, each with its expected value and the message (formatted
+# with the actual value) to give when it doesn't match
+STRIPE_CHECKS = (
+	("writeCursor",     0x60000, "write cursor at 0x%X, should've been at 0x60000"),
+	("lastWritePos",    0x60000, "last write position at 0x%X, should've been at 0x60000"),
+	("aggPos",          0x60000, "agg. position at 0x%X, should've been at 0x60000"),
+	("generation",      0,       "generation was %d, should've been 0"),
+	("phase",           0,       "phase was %d, should've been 0"),
+	("cycle",           0,       "cycle was %d, should've been 0"),
+	("syncSerial",      0,       "sync-serial was %d, should've been 0"),
+	("writeSerial",     0,       "write-serial was %d, should've been 0"),
+	("dirty",           0,       "dirty was %d, should've been 0"),
+	("sectorSize",      0x1000,  "sector size was 0x%X, should've been 0x1000"),
+	("unused",          0,       "unused was %d, should've been 0"),
+	("numBuckets",      4182,    "contains %d buckets, but should have 4182"),
+	("numSegs",         1,       "has %d segments, should be 1"),
+	("numDirEntries",   16728,   "contains %d DirEntrys, but should be 16728"),
+	("contentOffset",   0x60000, "content starts at 0x%X, but should start at 0x60000"),
+	("directoryOffset", 0x6000,  "directory (copy A) starts at 0x%X, but should start at 0x6000"),
+)
+
+# Just the expected values, so that a stripe that passes can be checked with a single comparison
+STRIPE_EXPECTED = tuple(expected for _, expected, _ in STRIPE_CHECKS)
+
+# Fetches all of the checked attributes of a stripe at once, in the same order
+STRIPE_ATTRS = operator.attrgetter(*(attr for attr, _, _ in STRIPE_CHECKS))
 
 def testSpan() -> typing.List[str]:
 	"""
@@ -144,9 +177,9 @@ def testDirEntry(dirent: directory.DirEntry = None) -> typing.List[str]:
 	if dirent._offset != 0xA000:
 		results.append("bad offset bits, expected 0xA000, got '0x%X'" % dirent._offset)
 
-	if dirent.Offset != 0xA000 * config.INK_MD5_SIZE():
-		results.append("bad offset, expected 0x%X, got '0x%X'" %\
-		                 (0xA000*config.INK_MD5_SIZE(), dirent.Offset))
+	expectedOffset = 0xA000 * config.INK_MD5_SIZE()
+	if dirent.Offset != expectedOffset:
+		results.append("bad offset, expected 0x%X, got '0x%X'" % (expectedOffset, dirent.Offset))
 
 	if not dirent:
 		results.append("__bool__ gave 'False' when 'True' was expected")
@@ -172,6 +205,12 @@ def testDirEntry(dirent: directory.DirEntry = None) -> typing.List[str]:
 	if not dirent.head:
 		results.append("head was not set, but should be")
 
+	# The bulk parser must agree with `DirEntry` on every field
+	for field, values in directory.parseDirEntries(rawDirEntry).items():
+		if len(values) != 1 or values[0] != getattr(dirent, field):
+			results.append("bulk-parsed %s was %r, expected [%r]" %\
+			               (field, values.tolist(), getattr(dirent, field)))
+
 	return ["(DirEntry): %s" % r for r in results]
 
 def testDoc(doc: directory.Doc = None) -> typing.List[str]:
@@ -192,58 +231,79 @@ def testStripe(s: stripe.Stripe) -> typing.List[str]:
 
 	results = []
 
-	s.readDir()
-
-	if s.writeCursor != 0x60000:
-		results.append("write cursor at 0x%X, should've been at 0x60000" % (s.writeCursor,))
-
-	if s.lastWritePos != 0x60000:
-		results.append("last write position at 0x%X, should've been at 0x60000" % (s.lastWritePos,))
-
-	if s.aggPos != 0x60000:
-		results.append("agg. position at 0x%X, should've been at 0x60000" % (s.aggPos,))
-
-	if s.generation:
-		results.append("generation was %d, should've been 0" % (s.generation,))
-
-	if s.phase:
-		results.append("phase was %d, should've been 0" % (s.phase,))
-
-	if s.cycle:
-		results.append("cycle was %d, should've been 0" % (s.cycle,))
-
-	if s.syncSerial:
-		results.append("sync-serial was %d, should've been 0" % (s.syncSerial,))
-
-	if s.writeSerial:
-		results.append("write-serial was %d, should've been 0" % (s.writeSerial,))
-
-	if s.dirty:
-		results.append("dirty was %d, should've been 0" % (s.dirty,))
+	actual = STRIPE_ATTRS(s)
+	if actual != STRIPE_EXPECTED:
+		results = [msg % (value,) for (_, expected, msg), value in zip(STRIPE_CHECKS, actual)\
+		                          if value != expected]
+
+	# Where the directory lies (and how big it is) comes from the metadata checked above, so if any
+	# of that was wrong, checking the directory as well would only pile on more failures.
+	if not results:
+		try:
+			s.readDir()
+		except (OSError, ValueError) as e:
+			results.append("couldn't read directory: %s" % e)
+		else:
+			# The directory is mapped straight from the file, so this also checks that none of it
+			# was cut off
+			if s.directory.shape != (s.numDirEntries, 5):
+				results.append("directory has shape %r, should be (%d, 5)" %\
+				               (s.directory.shape, s.numDirEntries))
 
-	if s.sectorSize != 0x1000:
-		results.append("sector size was 0x%X, should've been 0x1000" % (s.sectorSize,))
-
-	if s.unused:
-		results.append("unused was %d, should've been 0" % (s.unused,))
-
-	if s.numBuckets != 4182:
-		results.append("contains %d buckets, but should have 4182" % (s.numBuckets,))
-
-	if s.numSegs != 1:
-		results.append("has %d segments, should be 1" % (s.numSegs,))
-
-	if s.numDirEntries != 16728:
-		results.append("contains %d DirEntrys, but should be 16728" % (s.numDirEntries,))
-
-	if s.contentOffset != 0x60000:
-		results.append("content starts at 0x%X, but should start at 0x60000" % (s.contentOffset,))
+	return ["(Stripe): %s" % r for r in results] + testSpanBlockHeader(s.spanBlockHeader)
 
-	if s.directoryOffset != 0x6000:
-		results.append("directory (copy A) starts at 0x%X, but should start at 0x6000" % (s.directoryOffset,))
+def testStripeCopies() -> typing.List[str]:
+	"""
+	Checks that a stripe's metadata is read from copy B when it's newer than copy A, and from
+	copy A otherwise.
 
+	Returns a list of the tests failed.
+	"""
+	results = []
 
-	return ["(Stripe): %s" % r for r in results] + testSpanBlockHeader(s.spanBlockHeader)
+	def header(syncSerial: int, writeCursor: int) -> bytes:
+		"""
+		Packs a stripe metadata header with the given sync serial and write cursor.
+		"""
+		return stripe.Stripe.BASIC_STRUCT.pack(stripe.Stripe.MAGIC, 24, 0, 0, writeCursor,
+		                                       writeCursor, writeCursor, 0, 0, 0, syncSerial,
+		                                       0, 0, 0x1000, 0)
+
+	rawHeader = (0x4000, 0x4000, 1, 1)
+
+	with tempfile.NamedTemporaryFile() as f:
+		f.seek(rawHeader[0])
+		f.write(header(1, 0x60000))
+		f.flush()
+
+		s = stripe.Stripe(rawHeader, f.name)
+		s.read()
+		offsetB = utils.align(utils.align(s.directoryOffset + 10*s.numDirEntries) + s.sizeof)
+
+		for syncSerial, expected in ((0, 0x60000), (2, 0x70000)):
+			f.seek(offsetB)
+			f.write(header(syncSerial, 0x70000))
+			f.flush()
+
+			s = stripe.Stripe(rawHeader, f.name)
+			s.read()
+			if s.writeCursor != expected:
+				results.append("write cursor at 0x%X with copy B sync-serial %d, should've been 0x%X" %\
+				               (s.writeCursor, syncSerial, expected))
+
+	return ["(Stripe copies): %s" % r for r in results]
+
+# Parses the tester's command line (built once, rather than on every call to `main`)
+PARSER = argparse.ArgumentParser(description="Testing Suite for the Superior Cache ANalyzer",
+                                 epilog="NOTE: this test assumes that the cache is in the state defined "\
+                                 "by scan.test.py, which is meant to run this test script through autest.")
+PARSER.add_argument("--ats_configs",
+                    help="Specify the path to an ATS installation's config files to use for the tester."\
+                         " (if --ats_root is also specified, this should be relative to that)",
+                    type=str)
+PARSER.add_argument("--ats_root",
+                    help="Specify the path to the root ATS installation (NOTE: Changes the pwd)",
+                    type=str)
 
 def main() -> int:
 	"""
@@ -251,31 +311,20 @@ def main() -> int:
 
 	Returns the number of failed tests.
 	"""
-	args = argparse.ArgumentParser(description="Testing Suite for the Superior Cache ANalyzer",
-	                               epilog="NOTE: this test assumes that the cache is in the state defined "\
-	                               "by scan.test.py, which is meant to run this test script through autest.")
-	args.add_argument("--ats_configs",
-	                  help="Specify the path to an ATS installation's config files to use for the tester."\
-	                       " (if --ats_root is also specified, this should be relative to that)",
-	                  type=str)
-	args.add_argument("--ats_root",
-	                  help="Specify the path to the root ATS installation (NOTE: Changes the pwd)",
-	                  type=str)
-	args = args.parse_args()
+	args = PARSER.parse_args()
 
 	if args.ats_root:
 		os.chdir(args.ats_root)
 	if args.ats_configs:
 		config.init(args.ats_configs)
 
-	results = testSpan()
-
-	for result in results:
-		print(result)
+	results = testSpan() + testStripeCopies()
 
-	print("Failed %d tests." % len(results))
+	numFailed = len(results)
+	results.append("Failed %d tests.\n" % numFailed)
+	sys.stdout.write('\n'.join(results))
 
-	return len(results)
+	return numFailed
 
 if __name__ == '__main__':
 	# Once tests are stable, will exit with `main`'s return value.